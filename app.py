@@ -1,10 +1,37 @@
-from flask import Flask, render_template, render_template_string, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from flask_migrate import Migrate
+from werkzeug.security import generate_password_hash, check_password_hash
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+import concurrent.futures
+import functools
+import hmac
+import io
 import os
+import re
+import tempfile
+import time
 import base64
 from dotenv import load_dotenv
+import jinja2
+
+# Optional imaging stack for real perceptual-hash face comparison; the app
+# falls back to the mock size check when these are not installed.
+try:
+    import numpy as np
+    from PIL import Image
+    FACE_HASH_AVAILABLE = True
+except ImportError:
+    np = None
+    Image = None
+    FACE_HASH_AVAILABLE = False
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Load environment variables from .env file (for local testing with DATABASE_URL)
 load_dotenv()
@@ -17,27 +44,179 @@ app = Flask(__name__)
 cloud_db_url = os.environ.get('DATABASE_URL')
 if cloud_db_url:
     app.config['SQLALCHEMY_DATABASE_URI'] = cloud_db_url
+    # Tuned connection pool for cloud Postgres: enough connections for
+    # concurrent logins, pre-ping to drop stale connections instead of
+    # erroring mid-request, and LIFO checkout to keep a warm working set.
+    # Override pool sizing via SQLALCHEMY_POOL_SIZE / SQLALCHEMY_MAX_OVERFLOW
+    # when the worker count changes.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        "pool_size": int(os.environ.get("SQLALCHEMY_POOL_SIZE", 20)),
+        "max_overflow": int(os.environ.get("SQLALCHEMY_MAX_OVERFLOW", 10)),
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "pool_use_lifo": True,
+    }
 else:
     # Fallback to local SQLite ONLY if DATABASE_URL is not set (Development Only)
+    # The default pool (one connection per checkout) is the right shape for a
+    # file-backed SQLite DB under the threaded dev server; sharing a single
+    # connection across threads is only safe for in-memory databases.
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
-    
+
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Must set a secret key to use Flask sessions
-app.secret_key = os.urandom(24)
+# Static assets (ui.js/ui.css) never change between deploys; let browsers
+# cache them for a year instead of refetching on every navigation
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000
+
+# Templates live under templates/ as real files so Jinja can persist their
+# compiled bytecode; the shared FileSystemBytecodeCache means each template
+# is compiled once and reused across workers.
+_jinja_cache_dir = os.path.join(tempfile.gettempdir(), 'jinja_cache')
+os.makedirs(_jinja_cache_dir, exist_ok=True)
+app.jinja_env.auto_reload = False
+app.jinja_env.cache_size = 400
+app.jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache(_jinja_cache_dir)
+
+# Compile every template at boot so the first request of each page hits the
+# in-memory template cache instead of paying parse+compile (or a bytecode-
+# cache read) inline.
+for _name in app.jinja_env.list_templates(extensions=('html',)):
+    app.jinja_env.get_template(_name)
+
+def _load_or_create_persistent_key():
+    """Dev-only fallback: keeps a stable 32-byte key in the instance folder
+    so sessions survive restarts without needing FLASK_SECRET_KEY set."""
+    key_path = os.path.join(app.instance_path, 'secret_key')
+    try:
+        with open(key_path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        key = os.urandom(32)
+        os.makedirs(app.instance_path, exist_ok=True)
+        with open(key_path, 'wb') as f:
+            f.write(key)
+        return key
+
+# Must set a secret key to use Flask sessions. Regenerating it per process
+# (os.urandom on boot) invalidated every session on each deploy and broke
+# cookies across workers, so use a stable key from the environment; in cloud
+# deployments the env var is mandatory.
+_secret = os.environ.get("FLASK_SECRET_KEY")
+if _secret:
+    app.secret_key = _secret
+elif cloud_db_url:
+    raise RuntimeError("FLASK_SECRET_KEY must be set when running against a cloud database.")
+else:
+    app.secret_key = _load_or_create_persistent_key()
+
+# Server-side sessions when REDIS_URL is set (Cloud deployment). The default
+# signed-cookie sessions ship the whole registration_data dict back and forth
+# on every request of the multi-step flows; with Redis the cookie carries only
+# a session id. Local dev without Redis keeps the cookie sessions.
+redis_url = os.environ.get('REDIS_URL')
+if redis_url:
+    import redis
+    from flask_session import Session
+
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis.Redis.from_url(redis_url)
+    # Non-permanent sessions expire with the browser and get a TTL in Redis,
+    # so abandoned login flows don't accumulate keys; the prefix keeps the
+    # session keyspace separate from anything else on the instance.
+    app.config['SESSION_PERMANENT'] = False
+    app.config['SESSION_KEY_PREFIX'] = 'mfa_session:'
+    Session(app)
+
+# Response compression (optional): the login/register pages are a few KB of
+# HTML that brotli/gzip shrink 3-4x; skipped silently when flask-compress
+# isn't installed.
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+if Compress is not None:
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    app.config['COMPRESS_BR_LEVEL'] = 5
+    app.config['COMPRESS_MIN_SIZE'] = 500
+    Compress(app)
 
 db = SQLAlchemy(app)
 # Flask-Migrate is included but primarily used for flask db upgrade command
 migrate = Migrate(app, db)
 
 # WARNING: These credentials MUST be live and correct for OTP to send.
+# Read once at import into module constants — call sites never touch
+# os.environ at request time.
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_VERIFY_SERVICE_SID = os.getenv("TWILIO_VERIFY_SERVICE_SID")
+if not all((TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_VERIFY_SERVICE_SID)):
+    print("WARNING: Twilio env vars not fully set; OTP sends will fail until they are.")
 print("Loaded Verify SID:", TWILIO_VERIFY_SERVICE_SID)
 
-# Initialize Twilio Client
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """Twilio HTTP transport with a larger keep-alive pool.
+
+    Every OTP send/verify reuses a warm TLS connection instead of paying
+    a fresh TCP + TLS handshake per request.
+
+    The timeout bounds how long a worker can sit blocked on a Verify
+    round-trip; under the gevent worker class the wait yields to other
+    greenlets, so slow Twilio calls no longer cap overall throughput.
+    """
+
+    def __init__(self):
+        super().__init__(pool_connections=True, timeout=10)
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=50,
+            max_retries=Retry(total=3, backoff_factor=0.2),
+        )
+        self.session.mount("https://", adapter)
+
+
+@functools.lru_cache(maxsize=1)
+def get_twilio_client():
+    """Builds the Twilio Client on first use and memoizes it.
+
+    Lazy init keeps import (and app boot) from crashing when the Twilio
+    env vars are absent, e.g. in local dev without OTP.
+    """
+    return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=PooledTwilioHttpClient())
+
+
+@functools.lru_cache(maxsize=1)
+def get_verifications():
+    """Memoized Verify verifications resource.
+
+    Walking client.verify.v2.services(sid).verifications allocates a chain
+    of wrapper objects; resolve it once and reuse the terminal resource.
+    """
+    return get_twilio_client().verify.v2.services(TWILIO_VERIFY_SERVICE_SID).verifications
+
+
+# Background pool for Twilio calls whose result the response does not need
+# (resends): the worker hands the round-trip off and returns immediately.
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=32)
+
+
+def _send_otp_in_background(phone):
+    """Executor target: fire an OTP send and log (not surface) failures."""
+    try:
+        verification = get_verifications().create(to=phone, channel='sms')
+        if verification.status != 'pending':
+            print(f"Background OTP resend not pending: {verification.status}")
+    except Exception as e:
+        print(f"Background OTP resend failed: {e.__class__.__name__}")
+
+
+@functools.lru_cache(maxsize=1)
+def get_verification_checks():
+    """Memoized Verify verification_checks resource (see get_verifications)."""
+    return get_twilio_client().verify.v2.services(TWILIO_VERIFY_SERVICE_SID).verification_checks
 
 # --- COUNTRY CODES CONFIGURATION ---
 COUNTRY_CODES = {
@@ -50,497 +229,347 @@ COUNTRY_CODES = {
     "France (+33)": "+33", 
 }
 
-def generate_country_options(default_code="+91"):
-    """Generates the HTML options for the country code select element."""
+def _build_country_options(default_code):
     options_html = ""
     for label, code in COUNTRY_CODES.items():
         selected = 'selected' if code == default_code else ''
         options_html += f'<option value="{code}" {selected}>{label}</option>'
     return options_html
+
+# COUNTRY_CODES never changes at runtime, so build the <option> HTML for every
+# possible default once at import instead of looping per page render.
+_COUNTRY_OPTIONS_CACHE = {
+    code: _build_country_options(code) for code in set(COUNTRY_CODES.values()) | {"+91"}
+}
+
+@functools.lru_cache(maxsize=16)
+def generate_country_options(default_code="+91"):
+    """Returns the precomputed HTML options for the country code select element.
+
+    Codes outside the precomputed set (nothing selected) are built once and
+    memoized rather than raising.
+    """
+    return _COUNTRY_OPTIONS_CACHE.get(default_code) or _build_country_options(default_code)
+
+# Default option block handed to the register/OTP/forgot-password templates
+COUNTRY_OPTIONS = generate_country_options("+91")
 # ----------------------------------------
 
-# Database model
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), unique=True, nullable=False)
-    password = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), unique=True, nullable=False)
-    phone = db.Column(db.String(20), unique=True, nullable=True)
-    face_data = db.Column(db.Text, nullable=True) 
+# E.164 phone format, validated in one C-level regex pass instead of a
+# startswith + slice + isdigit triple scan
+_E164_RE = re.compile(r'^\+[1-9]\d{3,14}$')
 
-# --- CRITICAL: MANUAL TABLE CREATION FOR CLOUD CONNECTION ---
-if cloud_db_url:
-    with app.app_context():
-        try:
-            db.create_all()
-            print("INFO: Database connection to Cloud DB successful. Tables verified/created.")
-        except Exception as e:
-            print(f"ERROR: Failed to connect or create tables on Cloud DB. Details: {e}")
-else:
-    with app.app_context():
-        db.create_all()
 
+@functools.lru_cache(maxsize=None)
+def fixed_url(endpoint):
+    """Resolves the URL of a route with no variable parts exactly once.
 
-# Utility function to render consistent error/success messages
-def render_status_page(message, is_error=True):
-    color = 'red' if is_error else 'green'
-    icon = '❌' if is_error else '✅'
-    
-    # Check if the message indicates successful registration and offer a login button
-    login_link = '<a href="/login-factor-choice">Proceed to Login</a>'
-    
-    return render_template_string(f"""
-    <div style="font-family: Arial, sans-serif; max-width: 400px; margin: 50px auto; padding: 20px; border: 1px solid #ccc; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-        <h2 style="color: {color}; text-align: center;">{icon} {message}</h2>
-        <p style="text-align: center; margin-top: 15px;">{login_link if not is_error else ''} | <a href="/">Home</a></p>
-    </div>
-    """)
+    url_for walks the URL map on every call; the action URLs interpolated
+    into the login/register pages are static, so cache them per endpoint.
+    """
+    return app.url_map.bind('').build(endpoint)
 
-# --- MOCK FACE RECOGNITION FUNCTION ---
-def mock_verify_face(reference_data, captured_data):
+
+def _f(name, default=""):
+    """Fetches a form field once, stripped.
+
+    Missing fields return the default instead of raising KeyError, and each
+    handler pays for the dict lookup + strip allocation only once per field.
     """
-    Mocks the process of comparing a captured face against a stored reference face.
-    Returns True if both reference and captured data exist (simulating success).
+    value = request.form.get(name, default)
+    return value.strip() if value else default
+
+# Database model
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # index=True guarantees an index even on the SQLite dev fallback, where the
+    # unique constraint alone does not always translate into an index.
+    username = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    # Wide enough for a full scrypt hash string, never plaintext
+    password = db.Column(db.String(200), nullable=False)
+    email = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    phone = db.Column(db.String(20), unique=True, nullable=True, index=True)
+    # Raw PNG bytes (decoded once server-side); storing the browser's base64
+    # data URL as Text inflated every row by ~33% and forced a UTF-8 scan on read.
+    # deferred: the password/OTP/dashboard paths never need the image, so keep
+    # the blob off the wire unless a handler actually touches it.
+    face_data = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    # 64-bit perceptual hash of face_data, cached at registration so logins
+    # compare 8 bytes instead of re-hashing the stored PNG every time
+    face_hash = db.Column(db.LargeBinary(8), nullable=True)
+
+    # The OTP flows filter on username AND phone together; the composite index
+    # answers that lookup from a single B-tree seek instead of intersecting
+    # the two single-column indexes.
+    __table_args__ = (
+        db.Index('ix_user_username_phone', 'username', 'phone'),
+    )
+
+
+# Pre-built statements for the hot lookups. Building the select once at import
+# with bindparam placeholders means every execution is an immediate hit in
+# SQLAlchemy's compiled-query cache instead of re-constructing the AST per call.
+_USER_BY_NAME = select(User).where(User.username == bindparam("u"))
+_USER_BY_NAME_AND_PHONE = select(User).where(
+    User.username == bindparam("u"), User.phone == bindparam("p")
+)
+# Column-only variants for routes that never touch the full row: the OTP and
+# dashboard paths only need the phone or the profile columns, so skip ORM
+# hydration (and the identity map) entirely.
+_PHONE_BY_NAME = select(User.phone).where(User.username == bindparam("u"))
+_PHONE_BY_NAME_AND_PHONE = select(User.phone).where(
+    User.username == bindparam("u"), User.phone == bindparam("p")
+)
+_PROFILE_BY_NAME = select(User.username, User.email, User.phone).where(
+    User.username == bindparam("u")
+)
+_ID_BY_NAME_AND_PHONE = select(User.id).where(
+    User.username == bindparam("u"), User.phone == bindparam("p")
+)
+_PROFILE_BY_ID = select(User.username, User.email, User.phone).where(
+    User.id == bindparam("pk")
+)
+
+
+def get_user_by_username(username):
+    """Indexed single-user lookup via the SQLAlchemy 2.x select() API.
+
+    Faster than the legacy Model.query path: the pre-built statement hits
+    SQLAlchemy's compiled-query cache and no_autoflush skips the
+    pending-flush scan on a read-only lookup.
     """
-    # Simple check for existence and data size to mock a successful capture
-    if reference_data and captured_data and len(captured_data) > 100:
-        return True
-    return False
+    with db.session.no_autoflush:
+        return db.session.execute(_USER_BY_NAME, {"u": username}).scalar_one_or_none()
 
-# --- JAVASCRIPT AND STYLES (UI_SCRIPTS) ---
-# NOTE: Updated startCamera and capturePhoto to handle dynamic IDs
-UI_SCRIPTS = """
-<script>
-    const RESEND_COOLDOWN_SECONDS = 120; // 2 minutes
-
-    function togglePasswordVisibility(fieldId, iconId) {
-        const passwordField = document.getElementById(fieldId);
-        const toggleIcon = document.getElementById(iconId);
-        
-        if (passwordField.type === 'password') {
-            passwordField.type = 'text';
-            toggleIcon.textContent = '🔒'; // Locked icon when text is visible
-        } else {
-            passwordField.type = 'password';
-            toggleIcon.textContent = '👁️'; // Eye icon when text is hidden
-        }
-    }
 
-    function startCountdown(buttonId, timerKey, username, redirectRoute) {
-        const resendButton = document.getElementById(buttonId);
-        if (!resendButton) return;
+def get_user_by_username_and_phone(username, phone):
+    """Like get_user_by_username, but also matches the registered phone."""
+    with db.session.no_autoflush:
+        return db.session.execute(
+            _USER_BY_NAME_AND_PHONE, {"u": username, "p": phone}
+        ).scalar_one_or_none()
 
-        const storageKey = timerKey + '_' + username;
-        let storedTime = localStorage.getItem(storageKey);
-        let now = Date.now();
-        let remainingSeconds = 0;
 
-        if (storedTime) {
-            let elapsed = now - parseInt(storedTime, 10);
-            remainingSeconds = Math.floor((RESEND_COOLDOWN_SECONDS * 1000 - elapsed) / 1000);
-        }
+def get_phone_by_username(username, phone=None):
+    """Fetches only the phone column, or None when no user matches.
 
-        if (remainingSeconds > 0) {
-            resendButton.disabled = true;
-            resendButton.textContent = `Resend in (${remainingSeconds}s)`;
-            
-            let countdownInterval = setInterval(() => {
-                remainingSeconds--;
-                if (remainingSeconds <= 0) {
-                    clearInterval(countdownInterval);
-                    resendButton.textContent = 'Resend OTP';
-                    resendButton.disabled = false;
-                    localStorage.removeItem(storageKey);
-                } else {
-                    resendButton.textContent = `Resend in (${remainingSeconds}s)`;
-                }
-            }, 1000);
-        } else {
-             resendButton.textContent = 'Resend OTP';
-             resendButton.disabled = false;
-        }
-
-        resendButton.onclick = () => {
-            if (!resendButton.disabled) {
-                localStorage.setItem(storageKey, Date.now().toString());
-                window.location.href = `/resend-otp?username=${username}&next_route=${redirectRoute}`;
-            }
-        };
-    }
+    Pass phone to additionally require it to match the registered number
+    (the OTP-send existence check).
+    """
+    stmt, params = (_PHONE_BY_NAME, {"u": username})
+    if phone is not None:
+        stmt, params = (_PHONE_BY_NAME_AND_PHONE, {"u": username, "p": phone})
+    with db.session.no_autoflush:
+        return db.session.execute(stmt, params).scalar_one_or_none()
 
-    // --- UPDATED COUNTRY CODE HANDLER ---
-    function setupCountryCode(selectId, visibleInputId, hiddenInputId) {
-        const selectElement = document.getElementById(selectId);
-        const visibleInputElement = document.getElementById(visibleInputId);
-        const hiddenInputElement = document.getElementById(hiddenInputId);
-        const form = visibleInputElement.closest('form');
 
-        function cleanNumber(value) {
-            return value.replace(/[^0-9]/g, '').trim();
-        }
+def _verify_password(user, candidate):
+    """check_password_hash plus transparent upgrade of legacy plaintext rows.
 
-        function updateHiddenValue() {
-            const currentCode = selectElement.value;
-            const nationalNumber = cleanNumber(visibleInputElement.value);
+    Rows written before hashing landed hold the raw password, which the
+    werkzeug verifier rejects outright. Match those in constant time and
+    rewrite them as scrypt on the first successful login so the plaintext
+    ages out of the table.
+    """
+    stored = user.password or ""
+    if stored.startswith(("scrypt:", "pbkdf2:")):
+        return check_password_hash(stored, candidate)
+    if hmac.compare_digest(stored.encode(), candidate.encode()):
+        user.password = generate_password_hash(candidate, method="scrypt")
+        db.session.commit()
+        return True
+    return False
 
-            hiddenInputElement.value = currentCode + nationalNumber;
-            visibleInputElement.value = nationalNumber; 
-        }
 
-        selectElement.onchange = updateHiddenValue;
-        visibleInputElement.oninput = updateHiddenValue; 
-        visibleInputElement.onblur = updateHiddenValue;
-        
-        form.onsubmit = function() {
-            updateHiddenValue();
-            if (!hiddenInputElement.value.startsWith('+') || hiddenInputElement.value.length < 5) {
-                return true; 
-            }
-            return true;
-        }
-        
-        updateHiddenValue();
-    }
-    
-    // --- FACE SCAN JAVASCRIPT (Unified Logic) ---
-    let stream;
-    let isCapturing = false;
-
-    async function startCamera(videoElementId) {
-        const video = document.getElementById(videoElementId);
-        const message = document.getElementById('cameraMessage');
-        // Handle both button IDs (for setup and login)
-        const captureButton = document.getElementById('captureButton') || document.getElementById('captureLoginButton');
-        
-        if (!video) return;
-
-        try {
-            message.textContent = 'Requesting camera access...';
-            stream = await navigator.mediaDevices.getUserMedia({ video: { width: 320, height: 240 } });
-            video.srcObject = stream;
-            await video.play();
-            message.textContent = 'Camera ready. Please center your face.';
-            if (captureButton) {
-                captureButton.disabled = false;
-            }
-        } catch (err) {
-            message.style.color = 'red';
-            message.textContent = 'Error: Could not access camera. Please ensure permissions are granted.';
-            console.error("Camera access error:", err);
-            if (captureButton) {
-                captureButton.disabled = true;
-            }
-        }
-    }
+def get_profile_by_username(username):
+    """Fetches the (username, email, phone) row shown on the dashboard."""
+    with db.session.no_autoflush:
+        return db.session.execute(_PROFILE_BY_NAME, {"u": username}).one_or_none()
 
-    function capturePhoto(videoElementId, canvasElementId, formInputName, formId) {
-        if (isCapturing) return;
-        isCapturing = true;
 
-        const video = document.getElementById(videoElementId);
-        const canvas = document.getElementById(canvasElementId);
-        const context = canvas.getContext('2d');
-        const message = document.getElementById('cameraMessage');
-        const captureButton = document.getElementById('captureButton') || document.getElementById('captureLoginButton');
+def get_user_id_by_username_and_phone(username, phone):
+    """Fetches just the integer PK for a matching username/phone pair."""
+    with db.session.no_autoflush:
+        return db.session.execute(
+            _ID_BY_NAME_AND_PHONE, {"u": username, "p": phone}
+        ).scalar_one_or_none()
 
-        canvas.width = video.videoWidth;
-        canvas.height = video.videoHeight;
-        context.drawImage(video, 0, 0, canvas.width, canvas.height);
 
-        const dataURL = canvas.toDataURL('image/png');
-        const faceDataInput = document.getElementById(formInputName);
-        faceDataInput.value = dataURL;
+def get_profile_by_id(user_id):
+    """PK-keyed variant of get_profile_by_username: an integer point lookup
+    on the primary key instead of a VARCHAR compare."""
+    with db.session.no_autoflush:
+        return db.session.execute(_PROFILE_BY_ID, {"pk": user_id}).one_or_none()
 
-        stopCamera();
 
-        message.style.color = 'green';
-        message.textContent = 'Photo captured successfully! Submitting for verification...';
-        if (captureButton) {
-            captureButton.textContent = 'Captured!';
-            captureButton.disabled = true;
-        }
+def insert_on_conflict_do_nothing(index_elements, **values):
+    """Builds a dialect-appropriate INSERT ... ON CONFLICT DO NOTHING for User.
 
+    Both the PostgreSQL cloud backend and the SQLite dev fallback support
+    the clause; picking the insert by active dialect keeps registration a
+    single round-trip on either.
+    """
+    dialect_insert = pg_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+    return dialect_insert(User).values(**values).on_conflict_do_nothing(index_elements=index_elements)
+
+# --- MANUAL TABLE CREATION (one-shot, gated) ---
+# Running db.create_all() on every import costs a schema-reflection round trip
+# per gunicorn worker at boot. On the cloud DB only run it when explicitly
+# bootstrapping a fresh database (RUN_DB_INIT=1); normal deploys should use
+# `flask db upgrade` via the Flask-Migrate setup above. The throwaway local
+# SQLite file is still created unconditionally.
+if cloud_db_url:
+    if os.environ.get("RUN_DB_INIT") == "1":
+        with app.app_context():
+            try:
+                db.create_all()
+                print("INFO: Database connection to Cloud DB successful. Tables verified/created.")
+            except Exception as e:
+                print(f"ERROR: Failed to connect or create tables on Cloud DB. Details: {e}")
+else:
+    with app.app_context():
+        db.create_all()
 
-        setTimeout(() => {
-            document.getElementById(formId).submit();
-        }, 1000);
-    }
 
-    function stopCamera() {
-        if (stream) {
-            stream.getTracks().forEach(track => track.stop());
-            stream = null;
-        }
-    }
-</script>
-<style>
-    .password-container {
-        position: relative;
-    }
-    .password-toggle {
-        position: absolute;
-        right: 10px;
-        top: 50%;
-        transform: translateY(-50%);
-        cursor: pointer;
-        font-size: 1.2em;
-    }
-    .face-scan-container {
-        text-align: center;
-        background: #f0f4f8;
-        padding: 20px;
-        border-radius: 10px;
-        box-shadow: 0 4px 10px rgba(0,0,0,0.1);
-    }
-    video, canvas {
-        display: block;
-        margin: 10px auto;
-        border: 2px solid #007bff;
-        border-radius: 8px;
-        background-color: #333;
-    }
-    button {
-        transition: background-color 0.3s;
-    }
-    /* New styles for phone input group */
-    .phone-input-group {
-        display: flex;
-        gap: 5px;
-        align-items: center;
-    }
-    .phone-input-group select {
-        padding: 10px;
-        border: 1px solid #ddd;
-        border-radius: 4px;
-        flex: 0 0 40%; /* Code takes 40% width */
-    }
-    .phone-input-group input[type="text"] {
-        padding: 10px;
-        border: 1px solid #ddd;
-        border-radius: 4px;
-        flex: 1; /* Number takes remaining width */
-    }
-    .login-buttons {
-        display: flex;
-        flex-direction: column;
-        gap: 10px;
-        margin-top: 15px;
-    }
-</style>
-"""
-
-# 1. DASHBOARD HTML TEMPLATE 
-dashboard_html = """
-<div style="font-family: Arial, sans-serif; max-width: 600px; margin: 50px auto; padding: 30px; border: 1px solid #1e7e34; border-radius: 8px; background-color: #f8f9fa; box-shadow: 0 4px 12px rgba(0,123,255,0.2);">
-    <h1 style="text-align: center; color: #28a745;">✅ Welcome, {{ username }}!</h1>
-    <h3 style="text-align: center; color: #333;">Secure Dashboard (Logged in)</h3>
-    <hr style="border: 1px solid #ccc;">
-    <p style="font-size: 1.1em; color: #555; text-align: center;">You have successfully logged in via {{ login_method }}.</p>
-    <div style="margin-top: 20px; padding: 15px; background-color: #e2f0fb; border-radius: 6px;">
-        <p><strong>Your Details:</strong></p>
-        <ul>
-            <li><strong>Email:</strong> {{ email }}</li>
-            <li><strong>Phone:</strong> {{ phone }}</li>
-        </ul>
-    </div>
-    <div style="text-align: center; margin-top: 30px;">
-        <a href="/logout" style="padding: 10px 20px; font-size: 16px; background-color: #dc3545; color: white; border: none; border-radius: 5px; cursor: pointer; text-decoration: none;">Logout</a>
-    </div>
-</div>
-"""
+# Utility function to render consistent error/success messages
+def render_status_page(message, is_error=True):
+    color = 'red' if is_error else 'green'
+    icon = '❌' if is_error else '✅'
 
-# 2. FACE SCAN HTML TEMPLATE (Used for Setup and Login)
-face_scan_html = """
-<div class="face-scan-container" style="font-family: Arial, sans-serif; max-width: 500px; margin: 50px auto;">
-    <h2 style="color: #007bff; margin-bottom: 5px;">{{ page_title }}</h2>
-    <p id="cameraMessage" style="color: #6c757d; margin-bottom: 15px;">{{ status_message }}</p>
+    # Check if the message indicates successful registration and offer a login button
+    login_link = '<a href="/login-factor-choice">Proceed to Login</a>'
 
-    <video id="webcamVideo" width="320" height="240" autoplay playsinline></video>
+    return render_template(
+        'status.html',
+        color=color,
+        icon=icon,
+        message=message,
+        login_link=login_link,
+        is_error=is_error
+    )
 
-    <canvas id="photoCanvas" width="320" height="240" style="display: none;"></canvas>
+# --- FACE RECOGNITION (perceptual hash with mock fallback) ---
 
-    <form method="POST" action="{{ action_url }}" id="faceScanForm" style="margin-top: 20px;">
-        <input type="hidden" name="username" value="{{ username }}">
-        <input type="hidden" id="faceDataInput" name="face_data">
-        
-        <button type="button" 
-            id="captureButton" 
-            onclick="capturePhoto('webcamVideo', 'photoCanvas', 'faceDataInput', 'faceScanForm')"
-            disabled
-            style="padding: 10px 20px; font-size: 16px; background-color: #28a745; color: white; border: none; border-radius: 5px; cursor: pointer; width: 100%;">
-            {{ button_text }}
-        </button>
-    </form>
-    <p style="margin-top: 15px; color: #dc3545;">NOTE: This is a Mock Face Verification check.</p>
-    <div style="margin-top: 20px; text-align: center;">
-        <a href="{{ url_for('login_factor_choice') }}" style="color: #007bff; text-decoration: none;">&larr; Back to Login Factor Choice</a>
-    </div>
-</div>
-<script>
-    // Start the camera when the page loads
-    window.onload = function() {
-        startCamera('webcamVideo');
-    };
-    // Ensure camera stops when navigating away
-    window.onbeforeunload = stopCamera;
-</script>
-"""
-
-# 3. NEW FACTOR CHOICE HTML TEMPLATE (WITH FORGOT PASSWORD)
-factor_choice_html = """
-<div style="font-family: Arial, sans-serif; max-width: 450px; margin: 50px auto; padding: 25px; border: 1px solid #007bff; border-radius: 12px; box-shadow: 0 4px 15px rgba(0, 123, 255, 0.2);">
-    <h2 style="text-align: center; color: #007bff; margin-bottom: 20px;">Choose Your Login Factor</h2>
-    <p style="color: #666; text-align: center; margin-bottom: 20px;">Select one method to authenticate:</p>
-    
-    <div class="login-buttons">
-
-        <a href="{{ url_for('login_password_page') }}" style="text-decoration: none;">
-            <button style="width: 100%; padding: 12px; font-size: 16px; background-color: #ff5722; color: white; border: none; border-radius: 5px; cursor: pointer; font-weight: bold;">
-                🔑 Login with Password
-            </button>
-        </a>
-
-        <a href="{{ url_for('login_otp_page') }}" style="text-decoration: none;">
-            <button style="width: 100%; padding: 12px; font-size: 16px; background-color: #ffc107; color: #333; border: none; border-radius: 5px; cursor: pointer; font-weight: bold;">
-                📱 Login with OTP (SMS)
-            </button>
-        </a>
-
-        <a href="{{ url_for('login_face_page') }}" style="text-decoration: none;">
-            <button style="width: 100%; padding: 12px; font-size: 16px; background-color: #28a745; color: white; border: none; border-radius: 5px; cursor: pointer; font-weight: bold;">
-                👤 Login with Face Scan
-            </button>
-        </a>
-    </div>
+# Max Hamming distance (out of 64 bits) for two captures to count as the same face
+FACE_HASH_THRESHOLD = 12
 
-    <!-- NEW HOME BUTTON -->
-    <div style="text-align: center; margin-top: 20px;">
-        <a href="/" style="text-decoration: none;">
-            <button style="width: 100%; padding: 12px; font-size: 16px; background-color: #6c757d; color: white; border: none; border-radius: 5px; cursor: pointer; font-weight: bold;">
-                🏠 Back Home
-            </button>
-        </a>
-    </div>
+# Minimum decoded image size for a capture to be considered real
+MIN_FACE_BYTES = 75
 
-</div>
-"""
+def decode_face_data_url(face_data):
+    """Decodes a browser `data:image/png;base64,...` URL into raw PNG bytes.
 
+    Returns None when the payload is missing or not valid base64.
+    """
+    if not face_data:
+        return None
+    try:
+        b64 = face_data.split(',', 1)[1] if ',' in face_data else face_data
+        return base64.b64decode(b64)
+    except (ValueError, TypeError):
+        return None
+
+def compute_face_hash(face_data):
+    """Computes a 64-bit average perceptual hash of a captured face image.
+
+    Accepts either raw PNG bytes (as stored on User.face_data) or a browser
+    data URL; downsamples to an 8x8 grayscale thumbnail and thresholds
+    against the mean brightness, giving 8 raw bytes to store and compare
+    instead of the multi-KB PNG. Returns None when the image can't be
+    decoded or NumPy/Pillow are missing.
+    """
+    if not FACE_HASH_AVAILABLE or not face_data:
+        return None
+    try:
+        raw = decode_face_data_url(face_data) if isinstance(face_data, str) else face_data
+        if not raw:
+            return None
+        img = Image.open(io.BytesIO(raw)).convert('L').resize((8, 8), Image.LANCZOS)
+        pixels = np.asarray(img, dtype=np.uint8)
+        bits = (pixels > pixels.mean()).flatten()
+        return np.packbits(bits).tobytes()
+    except Exception:
+        return None
+
+def face_hash_distance(hash_a, hash_b):
+    """Hamming distance between two 64-bit face hashes (single popcount)."""
+    return (int.from_bytes(hash_a, 'big') ^ int.from_bytes(hash_b, 'big')).bit_count()
+
+def mock_verify_face(reference_data, captured_data, reference_hash=None):
+    """
+    Compares a captured face against the stored reference face.
 
-# password login
-password_login_html = f"""
-{UI_SCRIPTS}
-<div style="font-family: Arial, sans-serif; max-width: 400px; margin: 50px auto; padding: 20px; border: 1px solid #ccc; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-    <h2 style="text-align: center; color: #ff5722;">Login with Password</h2>
+    Uses the 64-bit perceptual hashes when the imaging stack is available
+    (a cheap XOR + popcount per compare); otherwise falls back to the
+    original mock existence/size check.
+    """
+    ref_hash = reference_hash or compute_face_hash(reference_data)
+    cap_hash = compute_face_hash(captured_data)
+    if ref_hash and cap_hash:
+        return face_hash_distance(ref_hash, cap_hash) <= FACE_HASH_THRESHOLD
 
-    <form method="POST" action="{{{{ action_url }}}}" style="display: grid; gap: 10px;">
+    # Simple check for existence and data size to mock a successful capture
+    if reference_data and captured_data and len(captured_data) > 100:
+        return True
+    return False
 
-        <label>Username:</label>
-        <input type="text" name="username" required style="padding: 10px; border: 1px solid #ddd; border-radius: 4px;">
+# --- JAVASCRIPT AND STYLES (UI_SCRIPTS) ---
+# The shared JS/CSS live in static/ui.js and static/ui.css so browsers cache
+# them once across page navigations. When the optional minifiers are
+# installed, a one-shot pass at boot writes .min variants next to the sources
+# and the pages reference those instead — the sources stay readable while
+# ~30-40% fewer bytes go over the wire.
+try:
+    from rjsmin import jsmin
+except ImportError:
+    jsmin = None
+try:
+    from rcssmin import cssmin
+except ImportError:
+    cssmin = None
+
+
+def _minified_asset(name, minifier):
+    """Minifies a static asset once at boot, returning the filename to serve.
+
+    Regenerates the .min file only when the source is newer; falls back to
+    the unminified source when the minifier isn't installed or the static
+    folder isn't writable.
+    """
+    if minifier is None:
+        return name
+    base, ext = name.rsplit('.', 1)
+    min_name = f"{base}.min.{ext}"
+    src_path = os.path.join(app.static_folder, name)
+    min_path = os.path.join(app.static_folder, min_name)
+    try:
+        if not os.path.exists(min_path) or os.path.getmtime(min_path) < os.path.getmtime(src_path):
+            with open(src_path) as f:
+                minified = minifier(f.read())
+            with open(min_path, 'w') as f:
+                f.write(minified)
+        return min_name
+    except OSError:
+        return name
 
-        <label>Password:</label>
-        <div class="password-container">
-            <input type="password" id="loginPassword" name="password" required style="padding: 10px; border: 1px solid #ddd; border-radius: 4px; width: 100%; box-sizing: border-box;">
-            <span class="password-toggle" id="loginToggle" onclick="togglePasswordVisibility('loginPassword', 'loginToggle')">&#128065;</span>
-        </div>
 
-        <input type="submit" value="Login"
-               style="padding: 10px; background-color: #ff5722; color: white; border: none; border-radius: 4px; cursor: pointer; margin-top: 15px;">
-    </form>
-
-    <!-- Forgot Password button -->
-    <p style="text-align: center; margin-top: 10px;">
-        <a href="{{{{ url_for('forgot_password') }}}}" style="color:#007bff; text-decoration:none; font-weight:bold;">
-            Forgot Password?
-        </a>
-    </p>
-
-    <p style="text-align: center; margin-top: 5px;">
-        <a href="{{{{ url_for('login_factor_choice') }}}}">&larr; Back to Factor Choice</a>
-    </p>
-
-</div>
-"""
-
-otp_login_html = f"""
-{UI_SCRIPTS}
-<div style="font-family: Arial, sans-serif; max-width: 400px; margin: 50px auto; padding: 20px; border: 1px solid #ccc; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-    <h2 style="text-align: center; color: #ffc107;">Login with OTP</h2>
-
-    <form method="POST" action="{{{{ action_url }}}}" style="display: grid; gap: 10px;">
-
-        <label>Username:</label>
-        <input type="text" name="username" required>
-
-        <label>Registered Phone:</label>
-        <div class="phone-input-group">
-            <select id="otpCountryCode">
-                {generate_country_options(default_code="+91")}
-            </select>
-            <input type="text" id="otpPhoneVisibleInput" required placeholder="Enter number (without code)">
-            <input type="hidden" name="phone" id="otpPhoneHiddenInput">
-        </div>
+UI_SCRIPTS = (
+    f'<script src="/static/{_minified_asset("ui.js", jsmin)}"></script>\n'
+    f'<link rel="stylesheet" href="/static/{_minified_asset("ui.css", cssmin)}">\n'
+)
 
-        <input type="submit" value="Send OTP">
-    </form>
-
-    <p style="text-align: center; margin-top: 10px;">
-        <a href="{{{{ url_for('login_factor_choice') }}}}">&larr; Back to Factor Choice</a>
-    </p>
-</div>
-
-<script>
-    window.onload = function() {{
-        setupCountryCode('otpCountryCode', 'otpPhoneVisibleInput', 'otpPhoneHiddenInput');
-    }};
-</script>
-"""
-
-# 6. NEW HTML TEMPLATE: Face Scan Login (Corrected URLs and IDs)
-face_login_html = f"""
-{UI_SCRIPTS}
-<div class="face-scan-container" style="font-family: Arial, sans-serif; max-width: 500px; margin: 50px auto;">
-    <h2 style="color: #28a745; margin-bottom: 5px;">Login with Face Scan</h2>
-    <p id="cameraMessage" style="color: #6c757d; margin-bottom: 15px;">Enter your username and click 'Start Camera' to verify your face.</p>
-
-    <form method="POST" action="{{{{ action_url }}}}" id="faceScanLoginForm" style="margin-top: 20px;">
-        <label style="display: block; text-align: left; margin-bottom: 5px;">Username:</label>
-        <input type="text" name="username" id="faceLoginUsername" required style="padding: 10px; border: 1px solid #ddd; border-radius: 4px; width: 100%; box-sizing: border-box; margin-bottom: 10px;">
-        
-        <button type="button" 
-            id="startCameraButton" 
-            onclick="startCamera('webcamLoginVideo'); this.style.display='none'; document.getElementById('webcamLoginVideo').style.display='block'; document.getElementById('captureLoginButton').style.display='block'; document.getElementById('cameraMessage').textContent='Camera ready. Please center your face.'" 
-            style="padding: 10px 20px; font-size: 16px; background-color: #007bff; color: white; border: none; border-radius: 5px; cursor: pointer; width: 100%;">
-            Start Camera
-        </button>
-
-        <video id="webcamLoginVideo" width="320" height="240" autoplay playsinline style="display: none;"></video>
-        <canvas id="photoCanvas" width="320" height="240" style="display: none;"></canvas>
-        <input type="hidden" id="faceDataInput" name="face_data">
-        
-        <button type="button" 
-            id="captureLoginButton" 
-            onclick="capturePhoto('webcamLoginVideo', 'photoCanvas', 'faceDataInput', 'faceScanLoginForm')"
-            disabled
-            style="display: none; padding: 10px 20px; font-size: 16px; background-color: #28a745; color: white; border: none; border-radius: 5px; cursor: pointer; width: 100%; margin-top: 10px;">
-            Capture & Verify Face
-        </button>
-    </form>
-    <p style="margin-top: 15px; color: #dc3545;">NOTE: Face Verification check.</p>
-    <div style="margin-top: 20px; text-align: center;">
-        <a href="{{{{ url_for('login_factor_choice') }}}}">&larr; Back to Factor Choice</a>
-    </div>
-</div>
-<script>
-    // Ensure camera stops when navigating away
-    window.onbeforeunload = stopCamera;
-</script>
-"""
 
-# --- ROUTES ---
+@app.context_processor
+def inject_ui_assets():
+    """Exposes the (possibly minified) shared asset tags to the templates."""
+    return {"ui_assets": UI_SCRIPTS}
 
-@app.route("/")
-def home():
-    home_html = """
+# Page templates live in templates/ (dashboard.html, face_scan.html,
+# factor_choice.html, login_password.html, login_otp.html, login_face.html,
+# register.html, status.html) and are rendered via render_template below.
+
+# 7. HOME PAGE (static, no template variables needed)
+home_html = """
     <div style="font-family: Arial, sans-serif; text-align: center; max-width: 600px; margin: 100px auto;">
         <h1 style="color: #007bff;">Multi-Factor Authentication Portal</h1>
         <p style="color: #555;">--------------------------------------------</p>
@@ -551,75 +580,59 @@ def home():
         <p style="margin-top: 20px;"><a href="/dashboard">Go to Dashboard (if logged in)</a></p>
     </div>
     """
+
+# --- ROUTES ---
+
+@app.after_request
+def add_immutable_cache_header(response):
+    """Marks static asset responses immutable so browsers skip revalidation."""
+    if request.path.startswith('/static/'):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.after_request
+def add_html_etag(response):
+    """Conditional GETs for the HTML pages.
+
+    The form pages render identically until a deploy changes them, so tag
+    each 200 text/html GET response with a content ETag and let
+    make_conditional turn a matching If-None-Match revalidation into an
+    empty 304 instead of re-sending the page.
+    """
+    if (request.method == 'GET' and response.status_code == 200
+            and response.mimetype == 'text/html'
+            and not response.direct_passthrough):
+        response.add_etag()
+        return response.make_conditional(request)
+    return response
+
+@app.route("/")
+def home():
     return home_html
 
 # --- REGISTRATION FLOW ---
 
 @app.route("/register", methods=["GET", "POST"])
 def register():
-    register_html = f"""
-{UI_SCRIPTS}
-<div style="font-family: Arial, sans-serif; max-width: 400px; margin: 50px auto; padding: 20px; border: 1px solid #ccc; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-    <h2 style="text-align: center; color: #333;">Register</h2>
-    <p style="color: #dc3545; text-align: center;">Note: Face ID setup happens next.</p>
-    <form method="POST" id="registerForm" style="display: grid; gap: 10px;">
-        <label>Username:</label>
-        <input type="text" name="username" required style="padding: 10px; border: 1px solid #ddd; border-radius: 4px;">
-        
-        <label>Password:</label>
-        <div class="password-container">
-            <input type="password" id="registerPassword" name="password" required style="padding: 10px; border: 1px solid #ddd; border-radius: 4px; width: 100%; box-sizing: border-box;">
-            <span class="password-toggle" id="registerToggle" onclick="togglePasswordVisibility('registerPassword', 'registerToggle')">&#128065;</span>
-        </div>
-        
-        <label>Email:</label>
-        <input type="email" name="email" required style="padding: 10px; border: 1px solid #ddd; border-radius: 4px;">
-        
-        <label>Phone:</label>
-        <div class="phone-input-group">
-            <select id="registerCountryCode">
-                {generate_country_options(default_code="+91")}
-            </select>
-            <input type="text" id="registerPhoneVisibleInput" required placeholder="Enter number (without code)">
-            <input type="hidden" name="phone" id="registerPhoneHiddenInput">
-        </div>
-        
-        <input type="submit" value="Next: Setup Face ID" style="padding: 10px; background-color: #007bff; color: white; border: none; border-radius: 4px; cursor: pointer; margin-top: 15px;">
-    </form>
-    <p style="text-align: center; margin-top: 15px;"><a href="/">Home</a></p>
-</div>
-<script>
-    window.onload = function() {{
-        setupCountryCode('registerCountryCode', 'registerPhoneVisibleInput', 'registerPhoneHiddenInput');
-    }};
-</script>
-"""
-
     # GET request → show the registration form
     if request.method == "GET":
-        return render_template_string(register_html)
+        return render_template('register.html', country_options=COUNTRY_OPTIONS)
 
     # POST request → process submitted form
-    username = request.form["username"].strip()
-    password = request.form["password"]
-    email = request.form["email"].strip()
-    phone = request.form["phone"].strip()
-
-    # ------------ VALIDATION ---------------
-    if User.query.filter_by(username=username).first():
-        return render_status_page(f'Username "{username}" already exists.', is_error=True)
+    username = _f("username")
+    password = request.form.get("password", "")
+    email = _f("email")
+    phone = _f("phone")
 
-    if User.query.filter_by(phone=phone).first():
-        return render_status_page(f'Phone "{phone}" already registered.', is_error=True)
+    # Duplicate detection happens once, at the final INSERT in
+    # save_reference_face (ON CONFLICT / unique constraints), instead of
+    # probing the table with three SELECTs here.
 
-    if User.query.filter_by(email=email).first():
-        return render_status_page(f'Email "{email}" already registered.', is_error=True)
-    # ---------------------------------------
-
-    # Save data for step 2 (face scan)
+    # Save data for step 2 (face scan). Hash the password immediately so the
+    # plaintext never leaves this handler (and never sits in the session).
     session['registration_data'] = {
         'username': username,
-        'password': password,
+        'password': generate_password_hash(password, method="scrypt"),
         'email': email,
         'phone': phone,
     }
@@ -632,59 +645,6 @@ def register():
     ))
 
 
-    # Validate duplicates BEFORE inserting
-    if registration_data:
-        existing_username = User.query.filter_by(username=registration_data['username']).first()
-        existing_email = User.query.filter_by(email=registration_data['email']).first()
-        existing_phone = User.query.filter_by(phone=registration_data['phone']).first()
-
-        if existing_username:
-            return render_status_page(f'Username "{registration_data["username"]}" already exists. Please login instead.')
-
-        if existing_phone:
-            return render_status_page(f'Phone number {registration_data["phone"]} is already registered. Please login instead.')
-
-        if existing_email:
-            return render_status_page(f'Email "{registration_data["email"]}" already exists. Try logging in.')
-
-        # Safe to insert now
-        try:
-            new_user = User(
-                username=registration_data['username'],
-                password=registration_data['password'],
-                email=registration_data['email'],
-                phone=registration_data['phone'],
-                face_data=face_data
-            )
-            db.session.add(new_user)
-            db.session.commit()
-
-            session.pop('registration_data', None)
-
-            return render_status_page(
-                f"Registration successfully completed for {username}. You can now log in.",
-                is_error=False
-            )
-
-        except Exception as e:
-            db.session.rollback()
-            return render_status_page(f"CRITICAL ERROR: Failed to save user to database: {e}")
-
-            
-    # Fallback for general face data update 
-    user = User.query.filter_by(username=username).first()
-    if user:
-        try:
-            user.face_data = face_data
-            db.session.commit()
-            return render_status_page(f"✅ Face data updated for {username}.", is_error=False)
-        except Exception as e:
-            return render_status_page(f"Error updating face data: {e}")
-            
-    # Default fallback
-    return redirect(url_for('login'))
-
-
 # --- LOGIN FACTOR CHOICE (New Primary Login Entry Point) ---
 
 @app.route("/login")
@@ -695,7 +655,7 @@ def login():
 @app.route("/login-factor-choice")
 def login_factor_choice():
     """Renders the page to choose one login factor (Password, OTP, Face)."""
-    return render_template_string(UI_SCRIPTS + factor_choice_html)
+    return render_template('factor_choice.html')
 
 # ------------------------------------------------------------------
 # --- DEDICATED LOGIN HANDLERS (New Single-Factor Logic) ---
@@ -704,20 +664,22 @@ def login_factor_choice():
 # 1. PASSWORD LOGIN
 @app.route("/login-password", methods=["GET"])
 def login_password_page():
-    # Fix: Generate the URL within the request context and pass it to the template
-    action_url = url_for('login_password_verify')
-    return render_template_string(password_login_html, action_url=action_url)
+    action_url = fixed_url('login_password_verify')
+    return render_template('login_password.html', action_url=action_url)
 
 @app.route("/login-password-verify", methods=["POST"])
 def login_password_verify():
-    username = request.form["username"].strip()
-    password = request.form["password"]
+    username = _f("username")
+    password = request.form.get("password", "")
 
-    user = User.query.filter_by(username=username, password=password).first()
-    
-    if user:
+    # Fetch by username only so the query is a plain index seek; compare the
+    # stored hash in Python rather than pushing a composite predicate to the DB.
+    user = get_user_by_username(username)
+
+    if user and _verify_password(user, password):
         session['logged_in'] = True
         session['username'] = user.username
+        session['user_id'] = user.id
         session['login_method'] = 'Password'
         return redirect(url_for('chatbot'))
     else:
@@ -726,30 +688,34 @@ def login_password_verify():
 # 2. OTP LOGIN (Step 1: Send)
 @app.route("/login-otp", methods=["GET"])
 def login_otp_page():
-    # Fix: Generate the URL within the request context and pass it to the template
-    action_url = url_for('login_otp_send')
-    return render_template_string(otp_login_html, action_url=action_url)
+    action_url = fixed_url('login_otp_send')
+    return render_template('login_otp.html', action_url=action_url, country_options=COUNTRY_OPTIONS)
 
 @app.route("/login-otp-send", methods=["POST"])
 def login_otp_send():
-    username = request.form["username"].strip()
-    phone = request.form["phone"].strip() 
+    username = _f("username")
+    phone = _f("phone")
 
-    user = User.query.filter_by(username=username, phone=phone).first()
+    if not _E164_RE.match(phone):
+        return render_status_page('Phone number must be a valid E.164 format.')
 
-    if not user:
+    user_id = get_user_id_by_username_and_phone(username, phone)
+    if user_id is None:
         return render_status_page('User not found or phone number does not match registered account.')
 
     try:
         # Twilio Verify: Send OTP
-        verification = twilio_client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID).verifications.create(to=user.phone, channel='sms')
+        verification = get_verifications().create(to=phone, channel='sms')
         
         if verification.status == 'pending':
-            # Store user info in session for next step
+            # Store user info in session for next step; the phone and PK ride
+            # along so the verify step skips its DB lookup
             session['otp_login_pending'] = username
+            session['otp_login_phone'] = phone
+            session['otp_login_user_id'] = user_id
             return redirect(url_for('login_otp_verify_page', 
                                     username=username, 
-                                    status_message=f"OTP sent to {user.phone}. Please check your phone."))
+                                    status_message=f"OTP sent to {phone}. Please check your phone."))
         else:
             return render_status_page(f"SMS Delivery Failed. Twilio status: {verification.status}")
 
@@ -767,50 +733,31 @@ def login_otp_verify_page():
 
     # If GET, render the verification form
     if request.method == "GET":
-        verification_html = f"""
-        {UI_SCRIPTS}
-        <div style="font-family: Arial, sans-serif; max-width: 400px; margin: 50px auto; padding: 20px; border: 1px solid #ccc; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-            <h2 style="text-align: center; color: #ffc107;">Verify OTP (OTP Login)</h2>
-            <p style="color: #007bff; text-align: center;">{status_message}</p>
-            <form method="POST" action="{url_for('login_otp_verify_page')}" style="display: grid; gap: 10px;">
-                <p style="text-align: center; font-weight: bold; margin-bottom: 5px;">Verifying User: {username}</p>
-                <input type="hidden" name="username" value="{username}">
-                
-                <label>OTP:</label>
-                <input type="text" name="otp" required maxlength="6" style="padding: 10px; border: 1px solid #ddd; border-radius: 4px;">
-                
-                <input type="submit" value="Verify OTP & Login" style="padding: 10px; background-color: #ffc107; color: #333; border: none; border-radius: 4px; cursor: pointer; margin-top: 15px;">
-            </form>
-            <button id="resendLoginOtpButton" style="padding: 10px; background-color: #dc3545; color: white; border: none; border-radius: 4px; cursor: pointer; margin-top: 10px; width: 100%;">Resend OTP</button>
-            <p style="text-align: center; margin-top: 15px;"><a href="{url_for('login_factor_choice')}">Cancel Login</a></p>
-        </div>
-        <script>
-            window.onload = function() {{
-                startCountdown('resendLoginOtpButton', 'login_otp_resend_time', '{username}', 'login_otp_verify_page');
-            }};
-        </script>
-        """
-        return render_template_string(verification_html)
+        return render_template('login_otp_verify.html', username=username, status_message=status_message)
 
     # If POST, verify the OTP
     if request.method == "POST":
-        username = request.form["username"].strip()
-        otp_code = request.form["otp"]
+        username = _f("username")
+        otp_code = _f("otp")
 
-        user = User.query.filter_by(username=username).first()
+        # Phone was stashed in the signed session at send time; only hit the
+        # DB when it is missing (e.g. the session predates this deploy).
+        phone = session.get('otp_login_phone') or get_phone_by_username(username)
 
-        if not user or session.get('otp_login_pending') != username:
+        if not phone or session.get('otp_login_pending') != username:
             return render_status_page("Session error. Please restart OTP login.")
 
         try:
-            verification_check = twilio_client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID).verification_checks.create(to=user.phone, code=otp_code)
+            verification_check = get_verification_checks().create(to=phone, code=otp_code)
 
             if verification_check.status == 'approved':
                 # OTP approved! Login successful.
                 session['logged_in'] = True
                 session['username'] = username
+                session['user_id'] = session.pop('otp_login_user_id', None)
                 session['login_method'] = 'OTP'
                 session.pop('otp_login_pending', None)
+                session.pop('otp_login_phone', None)
                 return redirect(url_for('chatbot'))
             else:
                 return redirect(url_for('login_otp_verify_page', username=username, status_message=f'Invalid OTP for user "{username}".'))
@@ -821,31 +768,37 @@ def login_otp_verify_page():
 # 3. FACE SCAN LOGIN
 @app.route("/login-face", methods=["GET"])
 def login_face_page():
-    # Fix: Generate the URL within the request context and pass it to the template
-    action_url = url_for('login_face_verify')
-    return render_template_string(UI_SCRIPTS + face_login_html, action_url=action_url)
+    action_url = fixed_url('login_face_verify')
+    return render_template('login_face.html', action_url=action_url)
 
 
 @app.route("/login-face-verify", methods=["POST"])
 def login_face_verify():
-    username = request.form["username"].strip()
+    username = _f("username")
     captured_face_data = request.form["face_data"]
 
-    user = User.query.filter_by(username=username).first()
+    user = get_user_by_username(username)
 
     if not user:
         return render_status_page("User not found.")
 
-    if not user.face_data:
-        return render_status_page("Face ID not set up for this user. Please use another factor.")
-
-    # Mock Face Verification Check
-    is_face_verified = mock_verify_face(user.face_data, captured_face_data)
+    # Hot path: both sides reduce to precomputed 64-bit vectors, so the
+    # compare is one XOR + popcount and the deferred face_data blob is
+    # never pulled from the DB.
+    captured_hash = compute_face_hash(captured_face_data)
+    if user.face_hash and captured_hash:
+        is_face_verified = face_hash_distance(user.face_hash, captured_hash) <= FACE_HASH_THRESHOLD
+    else:
+        # Legacy rows / missing imaging stack: fall back to the blob-based check
+        if not user.face_data:
+            return render_status_page("Face ID not set up for this user. Please use another factor.")
+        is_face_verified = mock_verify_face(user.face_data, captured_face_data, reference_hash=user.face_hash)
 
     if is_face_verified:
         # SUCCESS! Login successful.
         session['logged_in'] = True
         session['username'] = user.username
+        session['user_id'] = user.id
         session['login_method'] = 'Face Scan'
         return redirect(url_for('chatbot'))
     else:
@@ -862,18 +815,21 @@ def dashboard():
     if 'logged_in' in session and session['logged_in']:
         username = session['username']
         login_method = session.get('login_method', 'Unknown Method')
-        user = User.query.filter_by(username=username).first()
-        
-        if not user:
+        # PK point lookup when the session carries the id (all logins since
+        # it was added); fall back to the username index for older sessions.
+        user_id = session.get('user_id')
+        profile = get_profile_by_id(user_id) if user_id else get_profile_by_username(username)
+
+        if not profile:
             session.pop('logged_in', None)
             session.pop('username', None)
             return render_status_page("Authentication error. Please log in again.", is_error=True)
 
-        return render_template_string(
-            dashboard_html,
-            username=user.username,
-            email=user.email,
-            phone=user.phone,
+        return render_template(
+            'dashboard.html',
+            username=profile.username,
+            email=profile.email,
+            phone=profile.phone,
             login_method=login_method
         )
     else:
@@ -882,42 +838,48 @@ def dashboard():
 @app.route("/logout")
 def logout():
     """Logs the user out by clearing the session."""
-    # Clear all session variables related to authentication and flow
-    keys_to_clear = ['logged_in', 'username', 'login_method', 'otp_login_pending', 'registration_data', 'mfa_pending', 'mfa_flow']
-    for key in keys_to_clear:
-        session.pop(key, None)
-    
+    # Everything in the session is auth/flow state, so drop it in one go
+    # instead of popping a hardcoded key list that lags behind new flows.
+    session.clear()
+
     return render_status_page("You have been successfully logged out.", is_error=False)
 
 # --- RESEND OTP (Modified to handle a simpler flow) ---
 
+# Mirrors RESEND_COOLDOWN_SECONDS in static/ui.js; the client countdown is
+# cosmetic, this is the enforced limit.
+RESEND_COOLDOWN_SECONDS = 120
+
+
 @app.route("/resend-otp")
 def resend_otp():
     username = request.args.get("username").strip()
     next_route = request.args.get("next_route") 
 
-    user = User.query.filter_by(username=username).first()
+    # Server-side cooldown: a client bypassing the JS countdown gets turned
+    # away here before any DB or Twilio work happens.
+    now = time.time()
+    if now - session.get('last_resend_ts', 0) < RESEND_COOLDOWN_SECONDS:
+        if next_route in ('login_otp_verify_page', 'reset_password_page'):
+            return redirect(url_for(next_route, username=username,
+                                    status_message="Please wait 2 minutes between OTP resends."))
+        return redirect(url_for('login_otp_page'))
 
-    if not user:
+    phone = get_phone_by_username(username)
+
+    if not phone:
         if next_route == 'reset_password_page':
             return redirect(url_for('forgot_password'))
         return redirect(url_for('login_otp_page')) # Redirect to initial OTP login page
 
-    try:
-        verification = twilio_client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID) \
-            .verifications \
-            .create(to=user.phone, channel='sms')
-        
-        if verification.status == 'pending':
-            message = f"New OTP successfully sent to {user.phone}. Please wait 2 minutes before attempting to resend again."
-            # Redirect back to the OTP verification page
-            return redirect(url_for(next_route, username=username, status_message=message))
-        else:
-            sms_status = f"OTP initiation failed. Twilio status: {verification.status}"
-            return render_status_page(f"SMS Delivery Failed: {sms_status}")
+    session['last_resend_ts'] = now
 
-    except Exception as e:
-        return render_status_page(f"SMS Delivery Failed: Error connecting to Twilio. Status: {e.__class__.__name__}. Please verify credentials.")
+    # Fire-and-forget: the redirect goes out while the Twilio round-trip
+    # finishes on the executor, so a resend storm cannot tie up workers.
+    EXECUTOR.submit(_send_otp_in_background, phone)
+
+    message = f"New OTP requested for {phone}. Please wait 2 minutes before attempting to resend again."
+    return redirect(url_for(next_route, username=username, status_message=message))
 
 # --- FORGOT PASSWORD ROUTES ---
 
@@ -936,11 +898,11 @@ def face_scan_page():
     # REGISTRATION FLOW
     title = "Setup Face ID (Step 2/2)"
     button_text = "Capture & Save Reference Face (Finalize Registration)"
-    action_url = url_for('save_reference_face')
+    action_url = fixed_url('save_reference_face')
     message = request.args.get('status_message', "Take a clear photo for your face reference profile.")
             
-    return render_template_string(
-        UI_SCRIPTS + face_scan_html,
+    return render_template(
+        'face_scan.html',
         page_title=title,
         status_message=message,
         username=username,
@@ -957,96 +919,88 @@ def save_reference_face():
     if not username or not face_data:
         return render_status_page("Missing username or face data.", True)
 
+    # Decode the data URL once server-side; only the raw PNG bytes are stored
+    raw_face = decode_face_data_url(face_data)
+    if raw_face is None or len(raw_face) <= MIN_FACE_BYTES:
+        return render_status_page("Face capture was empty or unreadable. Please try again.", True)
+
     registration_data = session.get('registration_data')
 
-    # Ensure user followed registration step
+    # No registration in progress: allow a logged-in user to refresh their own
+    # reference face with one UPDATE (no prior SELECT round-trip)
     if not registration_data or registration_data["username"] != username:
-        return render_status_page("Registration session expired. Please restart.", True)
-
-    # Validate duplicates again
-    if User.query.filter_by(username=registration_data["username"]).first():
-        return render_status_page(f'Username "{username}" already exists.', True)
+        if session.get('logged_in') and session.get('username') == username:
+            result = db.session.execute(
+                update(User)
+                .where(User.username == username)
+                .values(face_data=raw_face, face_hash=compute_face_hash(raw_face))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            if result.rowcount:
+                return render_status_page(f"Face data updated for {username}.", is_error=False)
+            return render_status_page("User not found.", True)
 
-    if User.query.filter_by(email=registration_data["email"]).first():
-        return render_status_page(f'Email "{registration_data["email"]}" already exists.', True)
+        return render_status_page("Registration session expired. Please restart.", True)
 
-    if User.query.filter_by(phone=registration_data["phone"]).first():
-        return render_status_page(f'Phone "{registration_data["phone"]}" already exists.', True)
+    # Single INSERT ... ON CONFLICT (username) DO NOTHING replaces the old
+    # select-then-insert dance, so the whole register -> face-scan flow costs
+    # one DB round-trip here instead of three.
+    insert_stmt = insert_on_conflict_do_nothing(
+        index_elements=['username'],
+        username=registration_data["username"],
+        password=registration_data["password"],
+        email=registration_data["email"],
+        phone=registration_data["phone"],
+        face_data=raw_face,
+        face_hash=compute_face_hash(raw_face),
+    )
 
     try:
-        # Create new user
-        new_user = User(
-            username=registration_data["username"],
-            password=registration_data["password"],
-            email=registration_data["email"],
-            phone=registration_data["phone"],
-            face_data=face_data
-        )
-        db.session.add(new_user)
+        result = db.session.execute(insert_stmt)
         db.session.commit()
-
-        # Clear session
-        session.pop("registration_data", None)
-
+    except IntegrityError:
+        # Unique violation on email or phone (username conflicts are absorbed
+        # by ON CONFLICT above)
+        db.session.rollback()
         return render_status_page(
-            f"Registration successful! Face ID saved for {username}. You can now log in.",
-            is_error=False
+            f'Email "{registration_data["email"]}" or phone "{registration_data["phone"]}" is already registered. Please login instead.',
+            True
         )
-
     except Exception as e:
         db.session.rollback()
         return render_status_page(f"Database error: {e}", True)
 
+    if result.rowcount == 0:
+        return render_status_page(f'Username "{username}" already exists.', True)
+
+    # Clear session
+    session.pop("registration_data", None)
+
+    return render_status_page(
+        f"Registration successful! Face ID saved for {username}. You can now log in.",
+        is_error=False
+    )
+
 @app.route("/forgot-password", methods=["GET", "POST"])
 def forgot_password():
-    forgot_password_html = f"""
-{UI_SCRIPTS}
-<div style="font-family: Arial, sans-serif; max-width: 400px; margin: 50px auto; padding: 20px; border: 1px solid #ccc; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-    <h2 style="text-align: center; color: #ffc107;">Forgot Password</h2>
-    <p style="color: #666; text-align: center;">Enter your username and registered phone to receive a verification code.</p>
-    <form method="POST" id="forgotPasswordForm" style="display: grid; gap: 10px;">
-        <label>Username:</label>
-        <input type="text" name="username" required style="padding: 10px; border: 1px solid #ddd; border-radius: 4px;">
-        
-        <label>Registered Phone:</label>
-        <div class="phone-input-group">
-            <select id="forgotCountryCode">
-                {generate_country_options(default_code="+91")}
-            </select>
-            <input type="text" id="forgotPhoneVisibleInput" required placeholder="Enter number (without code)">
-            <input type="hidden" name="phone" id="forgotPhoneHiddenInput">
-        </div>
-        
-        <input type="submit" value="Send Reset OTP" style="padding: 10px; background-color: #ffc107; color: #333; border: none; border-radius: 4px; cursor: pointer; margin-top: 15px;">
-    </form>
-    <p style="text-align: center; margin-top: 15px;"><a href="{{{{ url_for('login_factor_choice') }}}}">Back to Login Choice</a> | <a href="/">Home</a></p>
-</div>
-<script>
-    window.onload = function() {{
-        setupCountryCode('forgotCountryCode', 'forgotPhoneVisibleInput', 'forgotPhoneHiddenInput');
-    }};
-</script>
-"""
-    
     if request.method == "POST":
-        username = request.form["username"].strip()
-        phone = request.form["phone"].strip() 
+        username = _f("username")
+        phone = _f("phone")
 
-        if not phone.startswith('+') or len(phone) < 5 or not phone[1:].isdigit():
+        if not _E164_RE.match(phone):
             return render_status_page('Phone number must be a valid E.164 format.')
 
-        user = User.query.filter_by(username=username, phone=phone).first()
-
-        if not user:
+        if get_phone_by_username(username, phone) is None:
             return render_status_page('User not found or phone number does not match registered account.')
 
         try:
-            verification = twilio_client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID) \
-                .verifications \
-                .create(to=user.phone, channel='sms')
+            verification = get_verifications().create(to=phone, channel='sms')
             
             if verification.status == 'pending':
-                return redirect(url_for('reset_password_page', username=user.username, status_message=f"OTP sent to {user.phone}. Please check your phone."))
+                session['reset_otp_phone'] = phone
+                session['reset_otp_username'] = username
+                return redirect(url_for('reset_password_page', username=username, status_message=f"OTP sent to {phone}. Please check your phone."))
             else:
                 sms_status = f"OTP initiation failed. Twilio status: {verification.status}"
                 return render_status_page(f"SMS Delivery Failed: {sms_status}")
@@ -1054,50 +1008,11 @@ def forgot_password():
         except Exception as e:
             return render_status_page(f"SMS Delivery Failed: Error connecting to Twilio. Status: {e.__class__.__name__}. Please verify credentials.")
 
-    return render_template_string(forgot_password_html)
+    return render_template('forgot_password.html', country_options=COUNTRY_OPTIONS)
 
 
 @app.route("/reset-password", methods=["GET", "POST"])
 def reset_password_page():
-    reset_password_html = UI_SCRIPTS + """
-<div style="font-family: Arial, sans-serif; max-width: 400px; margin: 50px auto; padding: 20px; border: 1px solid #ccc; border-radius: 8px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-    <h2 style="text-align: center; color: #ffc107;">Reset Password</h2>
-    <p style="color: #666; text-align: center;">Enter the code sent to your phone and choose a new password.</p>
-
-    <form method="POST" style="display: grid; gap: 10px;">
-        <p style="text-align: center; font-weight: bold; margin-bottom: 5px;">User: {{{{ username }}}}</p>
-
-        <input type="hidden" name="username" value="{{{{ username }}}}">
-
-        <label>Verification Code (OTP):</label>
-        <input type="text" name="otp" required maxlength="6" style="padding: 10px; border: 1px solid #ddd; border-radius: 4px;">
-
-        <label>New Password:</label>
-        <div class="password-container">
-            <input type="password" id="resetPassword" name="new_password" required style="padding: 10px; border: 1px solid #ddd; border-radius: 4px; width: 100%; box-sizing: border-box;">
-            <span class="password-toggle" id="resetToggle" onclick="togglePasswordVisibility('resetPassword', 'resetToggle')">&#128065;</span>
-        </div>
-
-        <input type="submit" value="Reset Password" style="padding: 10px; background-color: #007bff; color: white; border: none; border-radius: 4px; cursor: pointer; margin-top: 15px;">
-    </form>
-
-    <button id="resendResetOtpButton" style="padding: 10px; background-color: #dc3545; color: white; border: none; border-radius: 4px; cursor: pointer; margin-top: 10px; width: 100%;">Resend OTP</button>
-
-    <p style="text-align: center; margin-top: 15px;">
-        <a href="{{{{ url_for('login_factor_choice') }}}}">Back to Login Choice</a> | 
-        <a href="/">Home</a>
-    </p>
-</div>
-
-<script>
-    window.onload = function() {
-        startCountdown('resendResetOtpButton', 'reset_resend_time', '{{{{ username }}}}', 'reset_password_page');
-    };
-</script>
-"""
-
-    # --------------------- FIXED INDENTATION STARTS HERE ---------------------
-
     if request.method == "GET":
         username_from_arg = request.args.get("username", "")
         status_message = request.args.get("status_message", "")
@@ -1105,26 +1020,39 @@ def reset_password_page():
         if not username_from_arg:
             return redirect(url_for("forgot_password"))
 
-        return render_template_string(reset_password_html, username=username_from_arg)
+        return render_template('reset_password.html', username=username_from_arg)
 
     if request.method == "POST":
-        username = request.form["username"].strip()
-        otp_code = request.form["otp"]
-        new_password = request.form["new_password"]
-
-        user = User.query.filter_by(username=username).first()
+        username = _f("username")
+        otp_code = _f("otp")
+        new_password = request.form.get("new_password", "")
+
+        # Only trust the stashed phone for the username it was stored for at
+        # the forgot-password step; any other username goes back to the DB so
+        # an attacker's own OTP can't reset someone else's password.
+        if session.get('reset_otp_username') == username:
+            phone = session.get('reset_otp_phone')
+        else:
+            phone = get_phone_by_username(username)
 
-        if not user:
+        if not phone:
             return render_status_page(f'User "{username}" not found.')
 
         try:
-            verification_check = twilio_client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID).verification_checks.create(
-                to=user.phone, code=otp_code
-            )
+            verification_check = get_verification_checks().create(to=phone, code=otp_code)
 
             if verification_check.status == 'approved':
-                user.password = new_password
+                result = db.session.execute(
+                    update(User)
+                    .where(User.username == username)
+                    .values(password=generate_password_hash(new_password, method="scrypt"))
+                    .execution_options(synchronize_session=False)
+                )
                 db.session.commit()
+                if result.rowcount == 0:
+                    return render_status_page(f'User "{username}" not found.')
+                session.pop('reset_otp_phone', None)
+                session.pop('reset_otp_username', None)
                 return render_status_page(
                     f'Password reset successful for user "{username}". You can now log in.', 
                     is_error=False
@@ -1167,5 +1095,9 @@ def chatbot():
 
 
 if __name__ == "__main__":
+    # Dev entry point only. In production the Procfile runs gunicorn with
+    # gevent workers (gunicorn -w 4 -k gevent --worker-connections 1000
+    # app:app); the worker class monkey-patches sockets itself, so blocking
+    # Twilio calls become cooperative without any patching here.
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
@@ -3,29 +3,39 @@ from app import app, db, User
 def check_users():
     """Fetches and prints all users, including the face data status."""
     with app.app_context():
-        users = User.query.all()
-        
-        if not users:
+        total = db.session.query(db.func.count(User.id)).scalar()
+
+        if not total:
             print("--- No Users Found ---")
             print("Please run 'python app.py' first and register a new user.")
             return
 
-        print(f"--- Found {len(users)} User(s) in the Database ---")
+        print(f"--- Found {total} User(s) in the Database ---")
         print("{:<4} {:<15} {:<25} {:<20} {:<10}".format("ID", "USERNAME", "EMAIL", "PHONE", "FACE DATA"))
         print("-" * 74)
-        
-        for u in users:
-            # Check if face_data exists (it will be a long Base64 string if saved)
-            face_status = "SAVED" if u.face_data and len(u.face_data) > 100 else "MISSING"
-            
+
+        # Stream column tuples in batches and let the DB compute the blob
+        # length, so memory stays O(batch) and face_data bytes never leave
+        # the database.
+        rows = db.session.query(
+            User.id,
+            User.username,
+            User.email,
+            User.phone,
+            db.func.length(User.face_data).label('fd_len'),
+        ).yield_per(500)
+
+        for row in rows:
+            face_status = "SAVED" if row.fd_len and row.fd_len > 100 else "MISSING"
+
             print("{:<4} {:<15} {:<25} {:<20} {:<10}".format(
-                u.id, 
-                u.username, 
-                u.email, 
-                u.phone, 
+                row.id,
+                row.username,
+                row.email,
+                row.phone,
                 face_status
             ))
         print("-" * 74)
 
 if __name__ == "__main__":
-    check_users()
\ No newline at end of file
+    check_users()
@@ -0,0 +1,120 @@
+"""Face hash column, lookup indexes and binary face_data
+
+Brings a pre-migration database (the original db.create_all schema) up to
+the current model:
+
+* face_data becomes LargeBinary holding raw PNG bytes; existing base64
+  data-URL text values are decoded in place. face_hash stays NULL for
+  migrated rows — the app recomputes it the next time a face is saved and
+  falls back to the blob compare until then.
+* password widens to 200 chars for full scrypt hash strings.
+* adds the single-column lookup indexes and the composite
+  (username, phone) index used by the OTP flows.
+
+Fresh databases are still created directly by db.create_all (SQLite always,
+cloud behind RUN_DB_INIT=1); run `flask db stamp head` on those.
+
+Revision ID: 8f2c1d7a4b91
+Revises:
+Create Date: 2026-08-27 00:00:00.000000
+
+"""
+import base64
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8f2c1d7a4b91'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # Decode the legacy base64 data-URL text into raw bytes while the column
+    # is still TEXT, then clear it: the USING conversion below type-checks
+    # but would store the wrong bytes (UTF-8 of the base64 text, not the PNG),
+    # so the decoded values are written back after the type change.
+    decoded = {}
+    rows = bind.execute(
+        sa.text('SELECT id, face_data FROM "user" WHERE face_data IS NOT NULL')
+    ).fetchall()
+    for pk, data in rows:
+        try:
+            b64 = data.split(',', 1)[1] if ',' in data else data
+            decoded[pk] = base64.b64decode(b64)
+        except (ValueError, TypeError):
+            decoded[pk] = None
+    if rows:
+        bind.execute(sa.text('UPDATE "user" SET face_data = NULL'))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('face_hash', sa.LargeBinary(length=8), nullable=True))
+        batch_op.alter_column(
+            'password',
+            existing_type=sa.String(length=100),
+            type_=sa.String(length=200),
+            existing_nullable=False,
+        )
+        # Postgres has no text->bytea cast, so the type change needs an
+        # explicit USING expression; convert_to() type-checks even though the
+        # values were NULLed above. SQLite's batch recreate ignores it.
+        batch_op.alter_column(
+            'face_data',
+            existing_type=sa.Text(),
+            type_=sa.LargeBinary(),
+            existing_nullable=True,
+            postgresql_using="convert_to(face_data, 'UTF8')",
+        )
+        batch_op.create_index('ix_user_username', ['username'], unique=True)
+        batch_op.create_index('ix_user_email', ['email'], unique=True)
+        batch_op.create_index('ix_user_phone', ['phone'], unique=True)
+        batch_op.create_index('ix_user_username_phone', ['username', 'phone'], unique=False)
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('face_data', sa.LargeBinary))
+    for pk, raw in decoded.items():
+        if raw is not None:
+            bind.execute(user.update().where(user.c.id == pk).values(face_data=raw))
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    # Re-encode raw bytes back to bare base64 text (the data-URL media-type
+    # prefix is not recoverable and the old code tolerated its absence).
+    encoded = {}
+    rows = bind.execute(
+        sa.text('SELECT id, face_data FROM "user" WHERE face_data IS NOT NULL')
+    ).fetchall()
+    for pk, data in rows:
+        encoded[pk] = base64.b64encode(data).decode('ascii')
+    if rows:
+        bind.execute(sa.text('UPDATE "user" SET face_data = NULL'))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_username_phone')
+        batch_op.drop_index('ix_user_phone')
+        batch_op.drop_index('ix_user_email')
+        batch_op.drop_index('ix_user_username')
+        # Mirror of the upgrade: bytea->text also has no automatic cast.
+        batch_op.alter_column(
+            'face_data',
+            existing_type=sa.LargeBinary(),
+            type_=sa.Text(),
+            existing_nullable=True,
+            postgresql_using="encode(face_data, 'escape')",
+        )
+        batch_op.alter_column(
+            'password',
+            existing_type=sa.String(length=200),
+            type_=sa.String(length=100),
+            existing_nullable=False,
+        )
+        batch_op.drop_column('face_hash')
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('face_data', sa.Text))
+    for pk, text_value in encoded.items():
+        bind.execute(user.update().where(user.c.id == pk).values(face_data=text_value))
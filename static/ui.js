@@ -0,0 +1,160 @@
+const RESEND_COOLDOWN_SECONDS = 120; // 2 minutes
+
+function togglePasswordVisibility(fieldId, iconId) {
+    const passwordField = document.getElementById(fieldId);
+    const toggleIcon = document.getElementById(iconId);
+
+    if (passwordField.type === 'password') {
+        passwordField.type = 'text';
+        toggleIcon.textContent = '🔒'; // Locked icon when text is visible
+    } else {
+        passwordField.type = 'password';
+        toggleIcon.textContent = '👁️'; // Eye icon when text is hidden
+    }
+}
+
+function startCountdown(buttonId, timerKey, username, redirectRoute) {
+    const resendButton = document.getElementById(buttonId);
+    if (!resendButton) return;
+
+    const storageKey = timerKey + '_' + username;
+    let storedTime = localStorage.getItem(storageKey);
+    let now = Date.now();
+    let remainingSeconds = 0;
+
+    if (storedTime) {
+        let elapsed = now - parseInt(storedTime, 10);
+        remainingSeconds = Math.floor((RESEND_COOLDOWN_SECONDS * 1000 - elapsed) / 1000);
+    }
+
+    if (remainingSeconds > 0) {
+        resendButton.disabled = true;
+        resendButton.textContent = `Resend in (${remainingSeconds}s)`;
+
+        let countdownInterval = setInterval(() => {
+            remainingSeconds--;
+            if (remainingSeconds <= 0) {
+                clearInterval(countdownInterval);
+                resendButton.textContent = 'Resend OTP';
+                resendButton.disabled = false;
+                localStorage.removeItem(storageKey);
+            } else {
+                resendButton.textContent = `Resend in (${remainingSeconds}s)`;
+            }
+        }, 1000);
+    } else {
+         resendButton.textContent = 'Resend OTP';
+         resendButton.disabled = false;
+    }
+
+    resendButton.onclick = () => {
+        if (!resendButton.disabled) {
+            localStorage.setItem(storageKey, Date.now().toString());
+            window.location.href = `/resend-otp?username=${username}&next_route=${redirectRoute}`;
+        }
+    };
+}
+
+// --- UPDATED COUNTRY CODE HANDLER ---
+function setupCountryCode(selectId, visibleInputId, hiddenInputId) {
+    const selectElement = document.getElementById(selectId);
+    const visibleInputElement = document.getElementById(visibleInputId);
+    const hiddenInputElement = document.getElementById(hiddenInputId);
+    const form = visibleInputElement.closest('form');
+
+    function cleanNumber(value) {
+        return value.replace(/[^0-9]/g, '').trim();
+    }
+
+    function updateHiddenValue() {
+        const currentCode = selectElement.value;
+        const nationalNumber = cleanNumber(visibleInputElement.value);
+
+        hiddenInputElement.value = currentCode + nationalNumber;
+        visibleInputElement.value = nationalNumber; 
+    }
+
+    selectElement.onchange = updateHiddenValue;
+    visibleInputElement.oninput = updateHiddenValue; 
+    visibleInputElement.onblur = updateHiddenValue;
+
+    form.onsubmit = function() {
+        updateHiddenValue();
+        if (!hiddenInputElement.value.startsWith('+') || hiddenInputElement.value.length < 5) {
+            return true; 
+        }
+        return true;
+    }
+
+    updateHiddenValue();
+}
+
+// --- FACE SCAN JAVASCRIPT (Unified Logic) ---
+let stream;
+let isCapturing = false;
+
+async function startCamera(videoElementId) {
+    const video = document.getElementById(videoElementId);
+    const message = document.getElementById('cameraMessage');
+    const captureButton = document.querySelector('[data-capture-button]');
+
+    if (!video) return;
+
+    try {
+        message.textContent = 'Requesting camera access...';
+        stream = await navigator.mediaDevices.getUserMedia({ video: { width: 320, height: 240 } });
+        video.srcObject = stream;
+        await video.play();
+        message.textContent = 'Camera ready. Please center your face.';
+        if (captureButton) {
+            captureButton.disabled = false;
+        }
+    } catch (err) {
+        message.style.color = 'red';
+        message.textContent = 'Error: Could not access camera. Please ensure permissions are granted.';
+        console.error("Camera access error:", err);
+        if (captureButton) {
+            captureButton.disabled = true;
+        }
+    }
+}
+
+function capturePhoto(videoElementId, canvasElementId, formInputName, formId) {
+    if (isCapturing) return;
+    isCapturing = true;
+
+    const video = document.getElementById(videoElementId);
+    const canvas = document.getElementById(canvasElementId);
+    const context = canvas.getContext('2d');
+    const message = document.getElementById('cameraMessage');
+    const captureButton = document.querySelector('[data-capture-button]');
+
+    canvas.width = video.videoWidth;
+    canvas.height = video.videoHeight;
+    context.drawImage(video, 0, 0, canvas.width, canvas.height);
+
+    const dataURL = canvas.toDataURL('image/png');
+    const faceDataInput = document.getElementById(formInputName);
+    faceDataInput.value = dataURL;
+
+    stopCamera();
+
+    message.style.color = 'green';
+    message.textContent = 'Photo captured successfully! Submitting for verification...';
+    if (captureButton) {
+        captureButton.textContent = 'Captured!';
+        captureButton.disabled = true;
+    }
+
+
+    setTimeout(() => {
+        document.getElementById(formId).submit();
+    }, 1000);
+}
+
+function stopCamera() {
+    if (stream) {
+        stream.getTracks().forEach(track => track.stop());
+        stream = null;
+    }
+}